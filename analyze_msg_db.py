@@ -3,63 +3,502 @@ import sqlite3
 import sys
 import re
 import argparse
+import collections
+import contextlib
 from xml.etree import ElementTree as ET
 
-def extract_sender_info(bytes_extra):
-    """从BytesExtra字段中提取发送者信息"""
+from db_utils import connect_readonly, ensure_createtime_index, read_varint
+
+# 可选依赖: numba(依赖numpy)用于将BytesExtra扫描函数编译为本地代码
+# 导入它们需要数百毫秒，比分析少量消息本身还慢，因此只在需要时由_enable_numba加载
+np = None
+_HAS_NUMBA = False
+# 分析的消息数量达到该值时才启用numba，消息较少时导入和编译的开销无法收回
+_NUMBA_MIN_ROWS = 100000
+
+# ===== 预编译的正则表达式 =====
+# 模式1: 标准消息发送者ID 0x1A(长度)(0x08 0x01 0x12)(长度)(用户ID)
+_SENDER_RE = re.compile(b'\x1a.{1,2}\x08\x01\x12(.{1,30})', re.DOTALL)
+# 模式2: 特殊消息(某些群聊消息)
+_SENDER_RE_2 = re.compile(b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', re.DOTALL)
+# CompressContent中的XML内容
+_MSG_XML_RE = re.compile(b'<msg.*?</msg>', re.DOTALL)
+# 需要从XML中提取的标签和属性
+_XML_TAG_RES = [(tag, re.compile(f'<{tag}>(.*?)</{tag}>', re.DOTALL))
+                for tag in ['title', 'des', 'content', 'url', 'sourcedisplayname', 'sourceid']]
+_XML_ATTR_RES = [(attr, re.compile(f'{attr}="(.*?)"', re.DOTALL))
+                 for attr in ['appid', 'sdkver', 'title', 'des', 'sourcedisplayname', 'sourceid']]
+# 测试模式下依次尝试的发送者ID提取模式(分组名, 描述)
+_SENDER_PATTERNS = [
+    ('p1', "模式1: 标准消息"),
+    ('p2', "模式2: 特殊消息")
+]
+# 把所有模式合并为一个正则，一次扫描即可得到所有模式的匹配结果
+# 每个模式放在前瞻断言中，匹配时不消耗字符，因此不同模式的匹配可以重叠
+_SENDER_SCAN_RE = re.compile(
+    b'(?=(?P<p1>' + _SENDER_RE.pattern + b'))|(?=(?P<p2>' + _SENDER_RE_2.pattern + b'))',
+    re.DOTALL
+)
+
+# BytesExtra子消息中表示发送者ID的类型值
+_ENTRY_TYPE_SENDER = 1
+# 发送者子消息的特征字节: 类型字段(0x08)值为1，紧跟值字段的标签(0x12)
+_SENDER_MARKER = b'\x08\x01\x12'
+
+def _skip_field(buf, pos, end, wire_type):
+    """跳过一个非长度前缀的字段，返回新位置，字段超出end时抛出ValueError"""
+    if wire_type == 0:
+        pos = read_varint(buf, pos)[1]
+    elif wire_type == 1:
+        pos += 8
+    elif wire_type == 5:
+        pos += 4
+    else:
+        raise ValueError("不支持的wire type")
+    if pos > end:
+        raise ValueError("字段长度越界")
+    return pos
+
+def _scan_entry(buf, pos, end):
+    """扫描BytesExtra中的一个子消息，若为发送者ID则返回值的(起始, 结束)偏移，否则返回(-1, -1)"""
+    entry_type = -1
+    value_start = -1
+    value_end = -1
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        field_no = tag >> 3
+        wire_type = tag & 7
+        if wire_type == 2:
+            length, pos = read_varint(buf, pos)
+            # 先比较再相加，避免编译后的整数运算溢出
+            if length > end - pos:
+                raise ValueError("子消息长度越界")
+            if field_no == 2:
+                value_start = pos
+                value_end = pos + length
+            pos += length
+        elif field_no == 1 and wire_type == 0:
+            entry_type, pos = read_varint(buf, pos)
+            if pos > end:
+                raise ValueError("子消息长度越界")
+        else:
+            pos = _skip_field(buf, pos, end, wire_type)
+    if entry_type == _ENTRY_TYPE_SENDER and value_start >= 0:
+        return value_start, value_end
+    return -1, -1
+
+def _scan_sender_span(buf):
+    """
+    按Protobuf编码格式扫描BytesExtra字段，查找发送者ID
+
+    BytesExtra的结构为:
+    字段1: 固定头部 (0x0A 0x04 ...)
+    字段3: 可重复的子消息，子消息的字段1为类型(1表示发送者ID)，字段2为对应的值
+
+    返回:
+    (起始, 结束): 发送者ID在buf中的偏移，只返回偏移而不切片，避免复制数据；未找到时返回(-1, -1)
+    数据不符合Protobuf格式时抛出ValueError
+
+    这几个扫描函数只使用整数运算，安装了numba时会被编译为本地代码
+    """
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        field_no = tag >> 3
+        wire_type = tag & 7
+        if wire_type == 2:
+            length, pos = read_varint(buf, pos)
+            if length > end - pos:
+                raise ValueError("字段长度越界")
+            entry_end = pos + length
+            if field_no == 3:
+                value_start, value_end = _scan_entry(buf, pos, entry_end)
+                if value_start >= 0:
+                    return value_start, value_end
+            pos = entry_end
+        else:
+            pos = _skip_field(buf, pos, end, wire_type)
+    return -1, -1
+
+def _enable_numba():
+    """
+    安装了numba时，将扫描函数编译为本地代码，处理大量消息时更快
+
+    返回:
+    bool: 是否已启用numba
+    """
+    global np, _HAS_NUMBA, read_varint, _skip_field, _scan_entry, _scan_sender_span
+    if _HAS_NUMBA:
+        return True
+    try:
+        import numpy
+        from numba import njit
+    except ImportError:
+        return False
+    
+    np = numpy
+    read_varint = njit(cache=True)(read_varint)
+    _skip_field = njit(cache=True)(_skip_field)
+    _scan_entry = njit(cache=True)(_scan_entry)
+    _scan_sender_span = njit(cache=True)(_scan_sender_span)
+    _HAS_NUMBA = True
+    return True
+
+def _scan_sender_patterns(bytes_extra):
+    """
+    一次扫描BytesExtra，返回各模式匹配到的数据 {分组名: [用户ID部分的数据, ...]}
+
+    按各模式上一次匹配的结束位置过滤重叠的匹配，结果与对每个模式单独调用finditer一致
+    """
+    results = {name: [] for name, _ in _SENDER_PATTERNS}
+    last_end = dict.fromkeys(results, 0)
+    for match in _SENDER_SCAN_RE.finditer(bytes_extra):
+        # lastindex是最外层的模式分组，紧随其后的分组是用户ID部分
+        name = match.lastgroup
+        start, end = match.span(name)
+        if start >= last_end[name]:
+            results[name].append(match.group(match.lastindex + 1))
+            last_end[name] = end
+    return results
+
+# BytesExtra头部签名的长度: 固定头部(6字节) + 发送者子消息的标签和长度(2字节)
+_SIGNATURE_SIZE = 8
+# 最多记录的头部签名数量
+_MAX_SIGNATURES = 1024
+# 已确认布局的头部签名: 签名之后紧跟只包含发送者ID的子消息 (0x08 0x01 0x12 长度 用户ID)
+_sender_signatures = set()
+
+def _find_sender_span(bytes_extra):
+    """
+    返回发送者ID在bytes_extra中的(起始, 结束)偏移，未找到时返回(-1, -1)
+
+    同一账号导出的BytesExtra头部布局基本固定。完整扫描确认某个头部签名之后紧跟
+    发送者子消息时记录该签名，之后相同签名的数据只需校验几个字节即可直接定位用户ID
+    """
+    value_start = _SIGNATURE_SIZE + 4
+    if len(bytes_extra) > value_start and bytes_extra[:_SIGNATURE_SIZE] in _sender_signatures:
+        id_length = bytes_extra[value_start - 1]
+        # 子消息的内容必须恰好是 0x08 0x01 0x12 长度 用户ID
+        if (bytes_extra[_SIGNATURE_SIZE:value_start - 1] == _SENDER_MARKER
+                and id_length + 4 == bytes_extra[_SIGNATURE_SIZE - 1]
+                and value_start + id_length <= len(bytes_extra)):
+            return value_start, value_start + id_length
+    
+    buf = np.frombuffer(bytes_extra, dtype=np.uint8) if _HAS_NUMBA else bytes_extra
+    start, end = _scan_sender_span(buf)
+    
+    # 发送者子消息正好从签名之后开始，且子消息中只有类型和用户ID时，记录这个签名
+    if (start == value_start and len(_sender_signatures) < _MAX_SIGNATURES
+            and bytes_extra[_SIGNATURE_SIZE - 2] == 0x1A
+            and bytes_extra[_SIGNATURE_SIZE - 1] == end - _SIGNATURE_SIZE
+            and bytes_extra[_SIGNATURE_SIZE:value_start - 1] == _SENDER_MARKER):
+        _sender_signatures.add(bytes_extra[:_SIGNATURE_SIZE])
+    return start, end
+
+def _match_sender_id(bytes_extra):
+    """用正则表达式从BytesExtra中匹配发送者ID，作为结构化解析失败时的备用方案"""
+    # 模式1: 用户ID信息
+    # 在BytesExtra中，0x1A后紧跟一个字节表示长度，然后包含0x08 0x01 0x12模式
+    for match in _SENDER_RE.findall(bytes_extra):
+        # 第一个字节是长度，之后是实际的用户ID
+        if len(match) > 1:
+            id_length = match[0]  # 第一个字节是长度
+            if id_length > 0 and id_length < len(match):
+                user_id = match[1:1+id_length].decode('utf-8', errors='ignore')
+                if user_id:
+                    return user_id
+    return None
+
+def _extract_user_id(bytes_extra):
+    """从BytesExtra中提取发送者ID，未找到时返回None"""
+    # 这是在Protobuf编码的BytesExtra中找到的模式:
+    # 0x0A 0x04 0x08 0x10 0x10 0x00 (固定头部) 0x1A 长度字节 0x08 0x01 0x12 长度字节 (用户名)
+    # 发送者子消息一定包含 0x08 0x01 0x12，找不到时直接跳过解析
+    if bytes_extra.find(_SENDER_MARKER) < 0:
+        return None
+    
+    # 优先按Protobuf结构直接解析
+    try:
+        start, end = _find_sender_span(bytes_extra)
+        if start >= 0:
+            # 只对最终的用户ID做一次切片和解码
+            return bytes_extra[start:end].decode('utf-8', errors='ignore')
+        return None
+    except ValueError:
+        # 数据不是标准的Protobuf格式，退回到正则匹配
+        return _match_sender_id(bytes_extra)
+
+class _XMLCheckTarget:
+    """只检查XML是否合法、不构建元素树的解析目标"""
+    def close(self):
+        return None
+
+def extract_sender_info(bytes_extra, validate_xml=False):
+    """
+    从BytesExtra字段中提取发送者信息
+
+    validate_xml为True时会检查<msgsource>的XML格式，不合法时记录xml_error而不是xml
+    """
     sender_info = {}
     
     # 首先尝试从二进制数据中查找XML内容
     try:
-        # 寻找XML格式的数据
-        xml_match = re.search(b'<msgsource>.*?</msgsource>', bytes_extra, re.DOTALL)
-        if xml_match:
-            xml_data = xml_match.group(0).decode('utf-8', errors='ignore')
-            try:
-                # 解析XML
-                root = ET.fromstring(xml_data)
-                sender_info['xml'] = xml_data
-            except Exception as e:
-                sender_info['xml_error'] = str(e)
-        
-        # 这是在Protobuf编码的BytesExtra中找到的模式:
-        # 0x0A 0x04 0x08 0x10 0x10 0x00 (固定头部) 0x1A 长度字节 0x08 0x01 0x12 长度字节 (用户名)
-        
-        # 模式1: 用户ID信息
-        # 在BytesExtra中，0x1A后紧跟一个字节表示长度，然后包含0x08 0x01 0x12模式
-        sender_pattern = re.compile(b'\x1a.{1,2}\x08\x01\x12(.{1,30})', re.DOTALL)
-        sender_matches = sender_pattern.findall(bytes_extra)
-        
-        if sender_matches:
-            for match in sender_matches:
+        # 寻找XML格式的数据，标签是固定的，直接用bytes.find定位
+        xml_start = bytes_extra.find(b'<msgsource>')
+        xml_end = bytes_extra.find(b'</msgsource>', xml_start + 11) if xml_start >= 0 else -1
+        if xml_end >= 0:
+            xml_data = bytes_extra[xml_start:xml_end + 12].decode('utf-8', errors='ignore')
+            if validate_xml:
                 try:
-                    # 第一个字节是长度，之后是实际的用户ID
-                    if len(match) > 1:
-                        id_length = match[0]  # 第一个字节是长度
-                        if id_length > 0 and id_length < len(match):
-                            user_id = match[1:1+id_length].decode('utf-8', errors='ignore')
-                            if user_id:
-                                sender_info['user_id'] = user_id
-                                break
+                    parser = ET.XMLParser(target=_XMLCheckTarget())
+                    parser.feed(xml_data)
+                    parser.close()
+                    sender_info['xml'] = xml_data
                 except Exception as e:
-                    pass
+                    sender_info['xml_error'] = str(e)
+            else:
+                sender_info['xml'] = xml_data
+        
+        user_id = _extract_user_id(bytes_extra)
+        if user_id:
+            sender_info['user_id'] = user_id
     except Exception as e:
         sender_info['error'] = str(e)
     
     return sender_info
 
-def analyze_messages(db_path, limit=20, deep_analysis=False, test_patterns=False, desc_order=False):
+def bulk_extract_user_ids(db_path, batch_size=4096):
+    """
+    扫描MSG表中所有消息的BytesExtra，统计每个发送者ID的消息数量
+
+    发送者ID的提取规则与extract_sender_info相同，只是跳过XML部分；
+    消息数量达到_NUMBA_MIN_ROWS时启用numba编译的扫描函数
+
+    返回:
+    collections.Counter: {发送者ID: 消息数量}
+    """
+    counts = collections.Counter()
+    with contextlib.closing(connect_readonly(db_path)) as conn:
+        # 用最大rowid估算消息数量，避免COUNT(*)扫描全表
+        row_estimate = conn.execute("SELECT MAX(_rowid_) FROM MSG").fetchone()[0] or 0
+        if row_estimate >= _NUMBA_MIN_ROWS:
+            _enable_numba()
+        
+        cursor = conn.execute("SELECT BytesExtra FROM MSG WHERE BytesExtra IS NOT NULL")
+        while True:
+            blobs = [row[0] for row in cursor.fetchmany(batch_size)]
+            if not blobs:
+                break
+            counts.update(user_id for user_id in map(_extract_user_id, blobs) if user_id)
+    return counts
+
+def _decode_row(msg, validate_xml=False):
+    """解析一条消息记录，返回包含原始字段和提取出的发送者信息的字典"""
+    localId, talkerId, isSender, strTalker, strContent, bytesExtra, compressContent = msg
+    return {
+        'local_id': localId,
+        'talker_id': talkerId,
+        'is_sender': isSender,
+        'str_talker': strTalker,
+        'str_content': strContent,
+        'bytes_extra': bytesExtra,
+        'compress_content': compressContent,
+        'sender_info': extract_sender_info(bytesExtra, validate_xml) if bytesExtra else {}
+    }
+
+# 消息内容预览的最大字符数
+_PREVIEW_LENGTH = 30
+
+# 每条消息固定输出的头部信息
+_ROW_HEADER_TEMPLATE = "消息ID: {}\n会话ID: {}\n是否为自己发送: {}\n会话名称: {}\n消息内容: {}"
+
+def _format_row(row, deep_analysis=False, test_patterns=False):
+    """将_decode_row解析出的消息格式化为待输出的文本行列表"""
+    strContent = row['str_content']
+    bytesExtra = row['bytes_extra']
+    compressContent = row['compress_content']
+
+    # 提取内容的前30个字符，切片长度有上限，不会复制整条长消息
+    content_preview = strContent
+    if strContent and len(strContent) > _PREVIEW_LENGTH:
+        content_preview = strContent[:_PREVIEW_LENGTH] + "..."
+    
+    # 固定的消息头部用一个模板一次格式化
+    lines = [_ROW_HEADER_TEMPLATE.format(
+        row['local_id'], row['talker_id'], '是' if row['is_sender'] == 1 else '否',
+        row['str_talker'], content_preview
+    )]
+    
+    # 分析BytesExtra字段
+    if bytesExtra:
+        lines.append(f"BytesExtra长度: {len(bytesExtra)} 字节")
+        
+        # 十六进制显示前60个字节
+        if deep_analysis:
+            hex_data = bytesExtra.hex()
+            lines.append(f"BytesExtra(hex): {hex_data[:60]}..." if len(hex_data) > 60 else hex_data)
+        
+        # 如果是测试模式，尝试所有模式提取
+        if test_patterns:
+            lines.append("测试所有提取模式:")
+            # 所有模式都包含发送者特征字节，不包含时无需运行正则
+            if bytesExtra.find(_SENDER_MARKER) >= 0:
+                pattern_matches = _scan_sender_patterns(bytesExtra)
+            else:
+                pattern_matches = {}
+            for name, desc in _SENDER_PATTERNS:
+                found = False
+                for i, matched_bytes in enumerate(pattern_matches.get(name, ())):
+                    found = True
+                    try:
+                        # 解析长度字节和内容
+                        if len(matched_bytes) > 1:
+                            length = matched_bytes[0]  # 第一个字节是长度
+                            if length > 0 and length < len(matched_bytes):
+                                try:
+                                    user_id = matched_bytes[1:1+length].decode('utf-8', errors='ignore')
+                                    detail = f"ID: {user_id}"
+                                except:
+                                    detail = f"无法解码: {matched_bytes[1:1+length].hex()}"
+                            else:
+                                detail = f"长度无效: {length}, 数据: {matched_bytes.hex()}"
+                        else:
+                            detail = f"数据太短: {matched_bytes.hex()}"
+                    except Exception as e:
+                        detail = f"解析错误: {e}"
+                    lines.append(f"  {desc} 匹配 #{i+1}: {detail}")
+                
+                if not found:
+                    lines.append(f"  {desc}: 未找到匹配")
+        
+        # 提取的发送者信息
+        sender_info = row['sender_info']
+        if sender_info:
+            lines.append("提取的发送者信息:")
+            for key, value in sender_info.items():
+                if key == 'xml':
+                    # 只显示XML的前100个字符
+                    lines.append(f"  XML数据: {value[:100]}..." if len(value) > 100 else f"  XML数据: {value}")
+                elif key == 'user_id':
+                    lines.append(f"  用户ID: {value}")
+                else:
+                    lines.append(f"  {key}: {value}")
+    
+    # 分析CompressContent字段
+    if compressContent:
+        lines.append(f"CompressContent长度: {len(compressContent)} 字节")
+        
+        # 十六进制显示前60个字节
+        if deep_analysis:
+            compress_hex = compressContent.hex()
+            lines.append(f"CompressContent(hex): {compress_hex[:60]}..." if len(compress_hex) > 60 else compress_hex)
+            
+            # 尝试解码为UTF-8和UTF-16
+            try:
+                utf8_text = compressContent.decode('utf-8', errors='ignore')
+                if len(utf8_text) > 0:
+                    lines.append(f"CompressContent(utf-8): {utf8_text[:100]}..." if len(utf8_text) > 100 else utf8_text)
+            except:
+                pass
+                
+            try:
+                utf16_text = compressContent.decode('utf-16-le', errors='ignore')
+                if len(utf16_text) > 0:
+                    lines.append(f"CompressContent(utf-16): {utf16_text[:100]}..." if len(utf16_text) > 100 else utf16_text)
+            except:
+                pass
+            
+            # 查找可能的XML内容
+            xml_matches = _MSG_XML_RE.findall(compressContent)
+            
+            if xml_matches:
+                for i, xml_data in enumerate(xml_matches):
+                    try:
+                        xml_text = xml_data.decode('utf-8', errors='ignore')
+                        lines.append(f"XML内容 #{i+1}: {xml_text[:200]}..." if len(xml_text) > 200 else f"XML内容 #{i+1}: {xml_text}")
+                        
+                        # 提取有用的XML标签
+                        for tag, tag_pattern in _XML_TAG_RES:
+                            tag_matches = tag_pattern.findall(xml_text)
+                            if tag_matches:
+                                for j, content in enumerate(tag_matches):
+                                    lines.append(f"  {tag} #{j+1}: {content}")
+                        
+                        # 提取属性
+                        for attr, attr_pattern in _XML_ATTR_RES:
+                            attr_matches = attr_pattern.findall(xml_text)
+                            if attr_matches:
+                                for j, content in enumerate(attr_matches):
+                                    lines.append(f"  {attr}属性 #{j+1}: {content}")
+                    except Exception as e:
+                        lines.append(f"XML解析错误: {e}")
+    
+    lines.append("-" * 60)
+    return lines
+
+def _print_contacts(micro_cursor, all_sender_ids):
+    """输出联系人映射表，高亮显示在消息中找到的发送者ID"""
+    micro_cursor.execute("SELECT UserName, NickName, Remark FROM Contact")
+    contacts = micro_cursor.fetchall()
+    
+    lines = [f"联系人映射表 (共{len(contacts)}条):"]
+    for contact in contacts:
+        username, nickname, remark = contact
+        # 高亮显示在消息中找到的发送者ID
+        is_sender = username in all_sender_ids
+        highlight = "**" if is_sender else ""
+        lines.append(f"  {highlight}UserName: {username:<25} | 昵称: {nickname:<15} | 备注: {remark if remark else '无'}{highlight}")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def _print_sender_matches(micro_cursor, all_sender_ids):
+    """用IN查询批量获取所有发送者的联系人信息，并输出匹配结果"""
+    print("\n发送者ID与联系人匹配结果:")
+    # 分批查询，避免超过SQLite的参数数量上限(旧版本为999)
+    sender_ids = list(all_sender_ids)
+    contacts_by_id = {}
+    for start in range(0, len(sender_ids), 500):
+        batch = sender_ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        micro_cursor.execute(
+            f"SELECT UserName, NickName, Remark FROM Contact WHERE UserName IN ({placeholders})",
+            batch
+        )
+        contacts_by_id.update((row[0], row) for row in micro_cursor.fetchall())
+    
+    lines = []
+    for sender_id in all_sender_ids:
+        contact = contacts_by_id.get(sender_id)
+        if contact:
+            username, nickname, remark = contact
+            display_name = remark if remark else nickname
+            lines.append(f"  ID: {sender_id} => 匹配到: {display_name} (昵称: {nickname})")
+        else:
+            lines.append(f"  ID: {sender_id} => 未在联系人表中找到匹配")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def analyze_messages(db_path, limit=20, deep_analysis=False, test_patterns=False, desc_order=False,
+                     verbose=True, create_indexes=False, show_contacts=False):
     """分析MSG表中的消息，重点关注发送方信息"""
     if not os.path.exists(db_path):
         print(f"错误: 数据库文件不存在: {db_path}")
         return
     
+    # 标准输出是块缓冲的，进度信息需要立即刷新，否则在终端上要等到程序结束才能看到
     print(f"正在分析数据库: {db_path}")
-    print("-" * 60)
+    print("-" * 60, flush=True)
     
     try:
+        if create_indexes:
+            print("正在为MSG表的CreateTime列创建索引...", flush=True)
+            ensure_createtime_index(db_path)
+        
+        # 分析大量消息时才启用numba
+        if limit >= _NUMBA_MIN_ROWS:
+            _enable_numba()
+        
         # 连接数据库
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # 获取所有列名
@@ -68,193 +507,62 @@ def analyze_messages(db_path, limit=20, deep_analysis=False, test_patterns=False
         column_names = [col[1] for col in columns]
         
         # 获取消息数据
+        # 排序方向无法作为参数绑定，因此在两条固定的SQL中选择；LIMIT使用参数绑定，
+        # 保证语句文本不变，可以命中sqlite3的语句缓存
         order_by = "DESC" if desc_order else "ASC"
         cursor.execute(f"""
             SELECT localId, TalkerId, IsSender, StrTalker, StrContent, BytesExtra, CompressContent 
             FROM MSG 
             ORDER BY CreateTime {order_by}
-            LIMIT {limit}
-        """)
-        messages = cursor.fetchall()
+            LIMIT ?
+        """, (limit,))
         
-        print(f"分析 {len(messages)} 条消息的发送方信息:")
-        print("-" * 60)
+        print(f"分析最多 {limit} 条消息的发送方信息:")
+        print("-" * 60, flush=True)
         
         # 存储所有找到的发送者ID
         all_sender_ids = set()
-        sender_patterns = [
-            (b'\x1a.{1,2}\x08\x01\x12(.{1,30})', "模式1: 标准消息"),
-            (b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', "模式2: 特殊消息")
-        ]
+        message_count = 0
         
-        for msg in messages:
-            if len(msg) < 6:
-                print("消息数据不完整，跳过")
-                continue
-                
-            localId, talkerId, isSender, strTalker, strContent, bytesExtra = msg[:6]
-            compressContent = msg[6] if len(msg) > 6 else None
+        # 分批读取消息，每批解析完成后一次性输出
+        cursor.arraysize = 512
+        while True:
+            messages = cursor.fetchmany()
+            if not messages:
+                break
             
-            print(f"消息ID: {localId}")
-            print(f"会话ID: {talkerId}")
-            print(f"是否为自己发送: {'是' if isSender == 1 else '否'}")
-            print(f"会话名称: {strTalker}")
+            lines = []
+            for msg in messages:
+                # 深度分析时顺便检查XML格式
+                row = _decode_row(msg, deep_analysis)
+                user_id = row['sender_info'].get('user_id')
+                if user_id:
+                    all_sender_ids.add(user_id)
+                if verbose:
+                    lines.extend(_format_row(row, deep_analysis, test_patterns))
             
-            # 提取内容的前30个字符
-            content_preview = strContent[:30] + "..." if strContent and len(strContent) > 30 else strContent
-            print(f"消息内容: {content_preview}")
-            
-            # 分析BytesExtra字段
-            if bytesExtra:
-                print(f"BytesExtra长度: {len(bytesExtra)} 字节")
-                
-                # 十六进制显示前60个字节
-                if deep_analysis:
-                    hex_data = bytesExtra.hex()
-                    print(f"BytesExtra(hex): {hex_data[:60]}..." if len(hex_data) > 60 else hex_data)
-                
-                # 如果是测试模式，尝试所有模式提取
-                if test_patterns:
-                    print("测试所有提取模式:")
-                    for pattern, desc in sender_patterns:
-                        matches = re.finditer(pattern, bytesExtra, re.DOTALL)
-                        found = False
-                        for i, match in enumerate(matches):
-                            found = True
-                            try:
-                                matched_bytes = match.group(1)
-                                print(f"  {desc} 匹配 #{i+1}:", end=" ")
-                                
-                                # 解析长度字节和内容
-                                if len(matched_bytes) > 1:
-                                    length = matched_bytes[0]  # 第一个字节是长度
-                                    if length > 0 and length < len(matched_bytes):
-                                        try:
-                                            user_id = matched_bytes[1:1+length].decode('utf-8', errors='ignore')
-                                            print(f"ID: {user_id}")
-                                        except:
-                                            print(f"无法解码: {matched_bytes[1:1+length].hex()}")
-                                    else:
-                                        print(f"长度无效: {length}, 数据: {matched_bytes.hex()}")
-                                else:
-                                    print(f"数据太短: {matched_bytes.hex()}")
-                            except Exception as e:
-                                print(f"解析错误: {e}")
-                        
-                        if not found:
-                            print(f"  {desc}: 未找到匹配")
-                
-                # 提取发送者信息
-                sender_info = extract_sender_info(bytesExtra)
-                if sender_info:
-                    print("提取的发送者信息:")
-                    for key, value in sender_info.items():
-                        if key == 'xml':
-                            # 只显示XML的前100个字符
-                            print(f"  XML数据: {value[:100]}..." if len(value) > 100 else f"  XML数据: {value}")
-                        elif key == 'user_id':
-                            print(f"  用户ID: {value}")
-                            all_sender_ids.add(value)
-                        else:
-                            print(f"  {key}: {value}")
-            
-            # 分析CompressContent字段
-            if compressContent:
-                print(f"CompressContent长度: {len(compressContent)} 字节")
-                
-                # 十六进制显示前60个字节
-                if deep_analysis:
-                    compress_hex = compressContent.hex()
-                    print(f"CompressContent(hex): {compress_hex[:60]}..." if len(compress_hex) > 60 else compress_hex)
-                    
-                    # 尝试解码为UTF-8和UTF-16
-                    try:
-                        utf8_text = compressContent.decode('utf-8', errors='ignore')
-                        if len(utf8_text) > 0:
-                            print(f"CompressContent(utf-8): {utf8_text[:100]}..." if len(utf8_text) > 100 else utf8_text)
-                    except:
-                        pass
-                        
-                    try:
-                        utf16_text = compressContent.decode('utf-16-le', errors='ignore')
-                        if len(utf16_text) > 0:
-                            print(f"CompressContent(utf-16): {utf16_text[:100]}..." if len(utf16_text) > 100 else utf16_text)
-                    except:
-                        pass
-                    
-                    # 查找可能的XML内容
-                    xml_pattern = re.compile(b'<msg.*?</msg>', re.DOTALL)
-                    xml_matches = xml_pattern.findall(compressContent)
-                    
-                    if xml_matches:
-                        for i, xml_data in enumerate(xml_matches):
-                            try:
-                                xml_text = xml_data.decode('utf-8', errors='ignore')
-                                print(f"XML内容 #{i+1}: {xml_text[:200]}..." if len(xml_text) > 200 else f"XML内容 #{i+1}: {xml_text}")
-                                
-                                # 提取有用的XML标签
-                                tags_to_extract = ['title', 'des', 'content', 'url', 'sourcedisplayname', 'sourceid']
-                                for tag in tags_to_extract:
-                                    tag_pattern = re.compile(f'<{tag}>(.*?)</{tag}>', re.DOTALL)
-                                    tag_matches = tag_pattern.findall(xml_text)
-                                    if tag_matches:
-                                        for j, content in enumerate(tag_matches):
-                                            print(f"  {tag} #{j+1}: {content}")
-                                
-                                # 提取属性
-                                attrs_to_extract = ['appid', 'sdkver', 'title', 'des', 'sourcedisplayname', 'sourceid']
-                                for attr in attrs_to_extract:
-                                    attr_pattern = re.compile(f'{attr}="(.*?)"', re.DOTALL)
-                                    attr_matches = attr_pattern.findall(xml_text)
-                                    if attr_matches:
-                                        for j, content in enumerate(attr_matches):
-                                            print(f"  {attr}属性 #{j+1}: {content}")
-                            except Exception as e:
-                                print(f"XML解析错误: {e}")
-            
-            print("-" * 60)
+            message_count += len(messages)
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+        
+        print(f"共分析了 {message_count} 条消息")
         
         # 尝试查询Contact表来获取用户名映射
-        print("\n尝试查找用户ID映射表...")
+        print("\n尝试查找用户ID映射表...", flush=True)
         try:
             # 检查MicroMsg.db是否在同一目录
             micro_msg_db = os.path.join(os.path.dirname(os.path.dirname(db_path)), "MicroMsg.db")
             if os.path.exists(micro_msg_db):
                 print(f"找到MicroMsg.db: {micro_msg_db}")
-                micro_conn = sqlite3.connect(micro_msg_db)
-                micro_cursor = micro_conn.cursor()
-                
-                # 获取联系人信息
-                micro_cursor.execute("SELECT UserName, NickName, Remark FROM Contact")
-                contacts = micro_cursor.fetchall()
-                
-                print(f"联系人映射表 (共{len(contacts)}条):")
-                for contact in contacts:
-                    username, nickname, remark = contact
-                    display_name = remark if remark else nickname
-                    # 高亮显示在消息中找到的发送者ID
-                    is_sender = username in all_sender_ids
-                    highlight = "**" if is_sender else ""
-                    print(f"  {highlight}UserName: {username:<25} | 昵称: {nickname:<15} | 备注: {remark if remark else '无'}{highlight}")
-                
-                micro_conn.close()
-                
-                # 为找到的每个发送者ID尝试找到匹配的联系人
-                if all_sender_ids:
-                    print("\n发送者ID与联系人匹配结果:")
-                    for sender_id in all_sender_ids:
-                        # 重新连接数据库查询每个ID
-                        micro_conn = sqlite3.connect(micro_msg_db)
-                        micro_cursor = micro_conn.cursor()
-                        micro_cursor.execute("SELECT UserName, NickName, Remark FROM Contact WHERE UserName = ?", (sender_id,))
-                        contact = micro_cursor.fetchone()
-                        if contact:
-                            username, nickname, remark = contact
-                            display_name = remark if remark else nickname
-                            print(f"  ID: {sender_id} => 匹配到: {display_name} (昵称: {nickname})")
-                        else:
-                            print(f"  ID: {sender_id} => 未在联系人表中找到匹配")
-                        micro_conn.close()
+                with contextlib.closing(connect_readonly(micro_msg_db)) as micro_conn:
+                    micro_cursor = micro_conn.cursor()
+                    # 完整的联系人表可能有上千条，只在明确要求时输出
+                    if show_contacts:
+                        _print_contacts(micro_cursor, all_sender_ids)
+                    
+                    # 为找到的每个发送者ID尝试找到匹配的联系人
+                    if all_sender_ids:
+                        _print_sender_matches(micro_cursor, all_sender_ids)
         except Exception as e:
             print(f"读取联系人映射表失败: {e}")
     
@@ -265,6 +573,9 @@ def analyze_messages(db_path, limit=20, deep_analysis=False, test_patterns=False
             conn.close()
 
 if __name__ == "__main__":
+    # 输出量很大时按块缓冲输出，避免终端下每行都触发一次写操作；进度信息输出时单独刷新
+    sys.stdout.reconfigure(line_buffering=False)
+    
     parser = argparse.ArgumentParser(description='分析微信消息数据库中的发送者信息')
     parser.add_argument('db_path', nargs='?', default="weixin-gui-agent/User/wxid_8wn6q6udwtjq22/Msg/Multi/MSG.db", 
                         help='数据库文件路径')
@@ -272,7 +583,22 @@ if __name__ == "__main__":
     parser.add_argument('-d', '--deep', action='store_true', help='深度分析BytesExtra字段')
     parser.add_argument('-t', '--test', action='store_true', help='测试所有可能的提取模式')
     parser.add_argument('-o', '--order', action='store_true', help='按时间戳降序排序')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出每条消息的详细信息，只输出汇总结果')
+    parser.add_argument('--create-indexes', action='store_true',
+                        help='为MSG表的CreateTime列创建索引以加速排序（会修改数据库文件）')
+    parser.add_argument('--show-contacts', action='store_true', help='输出完整的联系人映射表')
+    parser.add_argument('--bulk', action='store_true', help='扫描全部消息，统计每个发送者ID的消息数量')
     
     args = parser.parse_args()
     
-    analyze_messages(args.db_path, args.num, args.deep, args.test, args.order) 
\ No newline at end of file
+    if args.bulk:
+        if not os.path.exists(args.db_path):
+            print(f"错误: 数据库文件不存在: {args.db_path}")
+        else:
+            sender_counts = bulk_extract_user_ids(args.db_path)
+            print(f"共找到 {len(sender_counts)} 个发送者ID:")
+            for user_id, count in sender_counts.most_common():
+                print(f"  {user_id:<25} {count:>8} 条消息")
+    else:
+        analyze_messages(args.db_path, args.num, args.deep, args.test, args.order, not args.quiet,
+                         args.create_indexes, args.show_contacts)
\ No newline at end of file
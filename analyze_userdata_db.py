@@ -2,7 +2,40 @@ import os
 import sqlite3
 import sys
 
-def analyze_db(db_path, show_structure=False, show_data=False, specific_table=None):
+from db_utils import connect_readonly
+
+def _quote_identifier(name):
+    """将表名转义为SQL标识符，表名无法作为参数绑定"""
+    return '"' + name.replace('"', '""') + '"'
+
+def _estimate_row_count(cursor, table_name, quoted_name, has_stat1=False):
+    """
+    估算表的记录数，避免COUNT(*)全表扫描
+
+    优先读取ANALYZE生成的sqlite_stat1统计信息，其次使用最大rowid，
+    对于WITHOUT ROWID的表退回到COUNT(*)
+    
+    部分索引(带WHERE的索引)的统计值只是索引覆盖的行数，不能代表整个表，因此跳过
+    """
+    if has_stat1:
+        try:
+            cursor.execute(f"PRAGMA index_list({quoted_name})")
+            partial_indexes = {row[1] for row in cursor.fetchall() if row[4]}
+            cursor.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ? AND stat IS NOT NULL", (table_name,))
+            counts = [int(stat.split()[0]) for idx, stat in cursor.fetchall() if idx not in partial_indexes]
+            if counts:
+                return max(counts)
+        except (sqlite3.Error, ValueError, IndexError):
+            pass
+    
+    try:
+        cursor.execute(f"SELECT MAX(_rowid_) FROM {quoted_name}")
+        return cursor.fetchone()[0] or 0
+    except sqlite3.Error:
+        cursor.execute(f"SELECT COUNT(*) FROM {quoted_name}")
+        return cursor.fetchone()[0]
+
+def analyze_db(db_path, show_structure=False, show_data=False, specific_table=None, approx_count=False):
     """分析SQLite数据库中的表结构和记录数量"""
     if not os.path.exists(db_path):
         print(f"错误: 数据库文件不存在: {db_path}")
@@ -13,7 +46,7 @@ def analyze_db(db_path, show_structure=False, show_data=False, specific_table=No
     
     try:
         # 连接数据库
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         
         # 获取所有表名
@@ -24,28 +57,37 @@ def analyze_db(db_path, show_structure=False, show_data=False, specific_table=No
             print("数据库中没有找到任何表。")
             return
             
+        has_stat1 = any(table[0] == 'sqlite_stat1' for table in tables)
+        
         print(f"数据库中共有 {len(tables)} 个表:")
         print("-" * 60)
         
         # 计算每个表的记录数
         for table in tables:
             table_name = table[0]
+            quoted_name = _quote_identifier(table_name)
             
             # 如果指定了特定表，只分析该表
             if specific_table and table_name != specific_table:
                 continue
                 
             try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
-                print(f"表 {table_name:<30} 包含 {count:>8} 条记录")
+                if approx_count:
+                    count = _estimate_row_count(cursor, table_name, quoted_name, has_stat1)
+                    print(f"表 {table_name:<30} 约有 {count:>8} 条记录")
+                else:
+                    cursor.execute(f"SELECT COUNT(*) FROM {quoted_name}")
+                    count = cursor.fetchone()[0]
+                    print(f"表 {table_name:<30} 包含 {count:>8} 条记录")
+                
+                # 列名只获取一次，表结构和数据预览共用
+                column_names = None
                 
                 # 如果需要显示表结构
                 if show_structure or specific_table:
                     try:
-                        cursor.execute(f"PRAGMA table_info({table_name})")
-                        columns = cursor.fetchall()
-                        column_names = [col[1] for col in columns]
+                        cursor.execute(f"PRAGMA table_info({quoted_name})")
+                        column_names = [col[1] for col in cursor.fetchall()]
                         print(f"  列结构: {', '.join(column_names)}")
                     except sqlite3.Error as e:
                         print(f"  无法获取表结构: {e}")
@@ -53,17 +95,14 @@ def analyze_db(db_path, show_structure=False, show_data=False, specific_table=No
                 # 如果需要显示表数据
                 if (show_data or specific_table) and count > 0:
                     try:
-                        # 限制返回数据量
-                        limit = 10 if count > 10 else count
-                        cursor.execute(f"SELECT * FROM {table_name} LIMIT {limit}")
+                        # 限制返回数据量，记录数不足时SQLite会提前结束
+                        cursor.execute(f"SELECT * FROM {quoted_name} LIMIT 10")
                         rows = cursor.fetchall()
                         
-                        if not columns:  # 如果上面没获取到列信息，这里重新获取
-                            cursor.execute(f"PRAGMA table_info({table_name})")
-                            columns = cursor.fetchall()
-                            column_names = [col[1] for col in columns]
+                        if column_names is None:  # 没有获取表结构时，直接使用查询结果的列名
+                            column_names = [desc[0] for desc in cursor.description]
                         
-                        print(f"  数据预览 (前 {limit} 条):")
+                        print(f"  数据预览 (前 {len(rows)} 条):")
                         for row in rows:
                             print("  " + "-" * 40)
                             for i, col_value in enumerate(row):
@@ -95,11 +134,13 @@ if __name__ == "__main__":
     parser.add_argument('-d', '--data', action='store_true', help='显示表数据')
     parser.add_argument('-t', '--table', help='指定要分析的表名')
     parser.add_argument('-a', '--all', action='store_true', help='分析所有找到的数据库')
+    parser.add_argument('--approx-count', action='store_true',
+                        help='使用统计信息或最大rowid估算记录数，避免对大表执行COUNT(*)')
     
     args = parser.parse_args()
     
     if args.db_path:
-        analyze_db(args.db_path, args.structure, args.data, args.table)
+        analyze_db(args.db_path, args.structure, args.data, args.table, args.approx_count)
     elif args.all or not args.db_path:
         # 尝试查找所有可能的数据库
         default_paths = [
@@ -114,5 +155,5 @@ if __name__ == "__main__":
         for path in default_paths:
             if os.path.exists(path):
                 print(f"找到数据库: {path}")
-                analyze_db(path, args.structure, args.data, args.table)
+                analyze_db(path, args.structure, args.data, args.table, args.approx_count)
                 print("\n" + "=" * 60 + "\n") 
\ No newline at end of file
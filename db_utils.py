@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import contextlib
+import pathlib
+
+# 只读读取时使用的SQLite参数: 禁止写入、内存临时表、64MB页缓存、1GB内存映射
+# main.py和analyze_*.py共用这组设置
+READ_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=1073741824",
+)
+
+def connect_readonly(db_path):
+    """
+    以只读模式打开SQLite数据库，并应用适合顺序扫描的PRAGMA设置
+
+    导出的数据库文件在读取期间不会被修改，因此加上immutable=1，让SQLite跳过文件锁和变更检测；
+    但如果旁边还有-wal文件，immutable模式会忽略其中尚未合并的数据，此时只使用mode=ro
+    """
+    uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+    if not os.path.exists(db_path + "-wal"):
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True)
+    for pragma in READ_PRAGMAS:
+        try:
+            conn.execute(pragma)
+        except sqlite3.Error:
+            pass  # 某些环境不支持个别设置，忽略即可
+    return conn
+
+def ensure_createtime_index(db_path):
+    """
+    为MSG表的CreateTime列创建索引，使按日期范围过滤和按时间排序的查询不必扫描全表
+
+    这会修改数据库文件，因此单独以读写模式打开，只在用户明确要求时调用
+    """
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_msg_createtime ON MSG(CreateTime)")
+        conn.commit()
+
+def read_varint(buf, pos):
+    """
+    从pos处读取一个Protobuf varint，返回(值, 新位置)
+
+    最多读取9个字节(63位)，保证结果在int64范围内；analyze_msg_db.py会用numba编译这个函数，
+    编译后的整数运算不能溢出为负数
+    """
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("varint数据不完整")
+        if shift > 56:
+            raise ValueError("varint过长")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
@@ -2,10 +2,15 @@ import sqlite3
 import datetime
 import os
 import argparse
+import contextlib
 import re
 import hashlib
-import random
-from typing import List, Tuple, Dict, Optional
+import functools
+import shutil
+import concurrent.futures
+from typing import Iterable, Iterator, List, Tuple, Dict, Optional
+
+from db_utils import connect_readonly, ensure_createtime_index, read_varint
 
 # ===== 常量定义 =====
 # 添加一个常量，用于生成随机名称
@@ -14,21 +19,65 @@ CHINESE_SURNAMES = ['李', '王', '张', '刘', '陈', '杨', '赵', '黄', '周
                    '梁', '宋', '郑', '谢', '韩', '唐', '冯', '于', '董', '萧', 
                    '程', '曹', '袁', '邓', '许', '傅', '沈', '曾', '彭', '吕']
 
+# 需要跳过的消息: 完全匹配的内容和以特定前缀开头的内容
+_SKIP_EXACT = frozenset(('收到一条图片', '收到一条视频'))
+_SKIP_PREFIX = ('<', 'sk', '[语音]')
+
+# 从数据库游标批量读取消息时每批的条数
+_FETCH_BATCH_SIZE = 1000
+# 输出文件的缓冲区大小
+_WRITE_BUFFER_SIZE = 1 << 20
+
+# 解析引用消息时已经提示过的异常类型，损坏的数据库可能每条消息都出错，同一类错误只提示一次
+_reported_parse_errors = set()
+
+# str.translate使用的删除表: 控制字符(0x00-0x1F)和非打印字符(0x7F-0x9F)
+_CTRL_DEL = dict.fromkeys([*range(0x00, 0x20), *range(0x7F, 0xA0)])
+
+# ===== 预编译的正则表达式 =====
+# 这些函数对每条消息都会调用，预先编译避免每次调用都重新查找/编译正则
+# 特殊消息模式(某些群聊消息)
+_RE_SPECIAL = re.compile(b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', re.DOTALL)
+# CompressContent中引用消息的<title>标签(宽松匹配，结束标签可能损坏)
+_RE_LOOSE_TITLE = re.compile(r'<title>(.*?)<[/\\]', re.DOTALL)
+# 消息内容中的HTML标签和API密钥
+_RE_HTML = re.compile(r'<[^>]+>')
+_RE_SK = re.compile(r'\bsk-[a-zA-Z0-9_-]{20,}')
+# 从聊天内容中提取名字: 引号中的名字、@后的名字、冒号前的名字
+_RE_QUOTE = re.compile(r'"([^"]+)"(?:邀请|修改|撤回|发起|说)')
+_RE_AT = re.compile(r'@([^\s@]+)')
+# decode_hex_string使用: 普通文本(3个以上连续中英文字符)、纯十六进制串、解码后有意义的文本、非十六进制字符
+_RE_TEXT = re.compile(r'[\u4e00-\u9fa5a-zA-Z]{3,}')
+_RE_HEX_ONLY = re.compile(r'^[0-9a-fA-F]+$')
+_RE_MEANINGFUL = re.compile(r'[\u4e00-\u9fa5a-zA-Z0-9]{3,}')
+_RE_NON_HEX = re.compile(r'[^0-9a-fA-F]')
+# 微信表情符号或特殊字符
+_RE_EMOJI = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF\U00002702-\U000027B0\U000024C2-\U0001F251]+')
+
+# 联系人名称查询: 优先使用备注，其次昵称，最后别名，空字符串视为没有设置
+_CONTACT_NAME_QUERY = """
+    SELECT UserName, Name FROM (
+        SELECT UserName, COALESCE(NULLIF(Remark, ''), NULLIF(NickName, ''), NULLIF(Alias, '')) AS Name
+        FROM Contact
+    )
+    WHERE UserName IS NOT NULL AND Name IS NOT NULL
+"""
+
 # ===== 数据库操作函数 =====
 def connect_to_database(db_path: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
-    """连接到SQLite数据库并返回连接和游标对象"""
+    """以只读模式连接到SQLite数据库并返回连接和游标对象"""
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"数据库文件不存在: {db_path}")
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_readonly(db_path)
         cursor = conn.cursor()
         return conn, cursor
     except sqlite3.Error as e:
         raise sqlite3.Error(f"连接数据库失败: {e}")
 
 def fetch_messages(cursor: sqlite3.Cursor, is_group_chat: bool = False, limit: Optional[int] = None, 
-                  date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Tuple]:
+                  date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[Tuple]:
     """
     获取聊天记录，支持限制条数和时间范围
     
@@ -40,12 +89,12 @@ def fetch_messages(cursor: sqlite3.Cursor, is_group_chat: bool = False, limit: O
     date_to: 结束日期，格式为YYYY-MM-DD
     
     返回:
-    消息列表，每条消息包含时间戳、是否发送者、内容等信息
+    执行查询后的游标，逐行返回消息，每条消息包含时间戳、是否发送者、内容等信息
     """
     # 无论群聊还是私聊，都需要获取StrTalker来识别发送者
     if is_group_chat:
         query = """
-        SELECT CreateTime, IsSender, StrContent, StrTalker, Type, BytesExtra, CompressContent
+        SELECT CreateTime, IsSender, StrContent, StrTalker, BytesExtra, CompressContent
         FROM MSG WHERE 1=1
         """
     else:
@@ -56,6 +105,20 @@ def fetch_messages(cursor: sqlite3.Cursor, is_group_chat: bool = False, limit: O
     
     params = []
     
+    # 在SQL中预先排除一定会被should_skip_message跳过的消息，避免读取它们的BLOB字段；
+    # 带有CompressContent的消息可能是引用回复，仍然交给Python判断
+    exact_placeholders = ", ".join("?" * (len(_SKIP_EXACT) + 1))
+    prefix_conditions = " AND ".join("substr(StrContent, 1, ?) != ?" for _ in _SKIP_PREFIX)
+    query += f"""
+        AND (CompressContent IS NOT NULL OR (
+            StrContent IS NOT NULL AND StrContent NOT IN ({exact_placeholders}) AND {prefix_conditions}
+        ))
+        """
+    params.append('')
+    params.extend(sorted(_SKIP_EXACT))
+    for prefix in _SKIP_PREFIX:
+        params.extend((len(prefix), prefix))
+    
     # 添加时间范围过滤
     if date_from:
         try:
@@ -80,12 +143,113 @@ def fetch_messages(cursor: sqlite3.Cursor, is_group_chat: bool = False, limit: O
     
     # 添加结果限制
     if limit and limit > 0:
-        query += f" LIMIT {limit}"
+        query += " LIMIT ?"
+        params.append(limit)
     
+    # 直接返回游标，写入时分批读取，避免一次性把所有消息(包括BLOB字段)加载到内存
+    cursor.arraysize = _FETCH_BATCH_SIZE  # 调用方不指定数量时，fetchmany()也按批读取
     cursor.execute(query, params)
-    return cursor.fetchall()
+    return cursor
 
 # ===== 发送者ID提取函数 =====
+# BytesExtra子消息中表示发送者ID的类型值
+_ENTRY_TYPE_SENDER = 1
+
+def _iter_pb_fields(buf: bytes, pos: int = 0) -> Iterator[Tuple[int, int, object]]:
+    """
+    依次解析Protobuf编码数据中的字段
+    
+    参数:
+    buf: Protobuf编码的数据
+    pos: 开始解析的位置
+    
+    返回:
+    生成器，依次返回(字段号, wire type, 值)，varint字段的值为整数，其他字段的值为bytes
+    数据不符合Protobuf格式时抛出ValueError
+    """
+    end = len(buf)
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        field_no = tag >> 3
+        wire_type = tag & 7
+        if wire_type == 0:
+            value, pos = read_varint(buf, pos)
+            yield field_no, wire_type, value
+            continue
+        if wire_type == 2:
+            length, pos = read_varint(buf, pos)
+        elif wire_type == 1:
+            length = 8
+        elif wire_type == 5:
+            length = 4
+        else:
+            raise ValueError("不支持的wire type")
+        if pos + length > end:
+            raise ValueError("字段长度越界")
+        yield field_no, wire_type, buf[pos:pos + length]
+        pos += length
+
+def _find_sender_in_protobuf(bytes_extra: bytes) -> Optional[str]:
+    """
+    按Protobuf编码格式查找发送者ID
+    
+    BytesExtra的结构为:
+    字段1: 固定头部 (0x0A 0x04 ...)
+    字段3: 可重复的子消息，子消息的字段1为类型(1表示发送者ID)，字段2为对应的值
+    """
+    for field_no, wire_type, entry in _iter_pb_fields(bytes_extra):
+        if field_no != 3 or wire_type != 2:
+            continue
+        entry_type = None
+        value = None
+        for sub_field_no, sub_wire_type, sub_value in _iter_pb_fields(entry):
+            if sub_field_no == 1 and sub_wire_type == 0:
+                entry_type = sub_value
+            elif sub_field_no == 2 and sub_wire_type == 2:
+                value = sub_value
+        if entry_type == _ENTRY_TYPE_SENDER and value:
+            user_id = value.decode('utf-8', errors='ignore')
+            if user_id:
+                return user_id
+    return None
+
+# 发送者子消息的特征字节: 类型字段(0x08 0x01)和值字段的标签(0x12)
+_SENDER_MARKER = b'\x08\x01\x12'
+
+def _scan_sender_marker(bytes_extra: bytes) -> Optional[str]:
+    """
+    用bytes.find按标准消息模式查找发送者ID: 0x1A(长度)(0x08 0x01 0x12)(长度)(用户ID)
+    结果与依次检查正则 \x1a.{1,2}\x08\x01\x12(.{1,30}) 的每个匹配相同
+    
+    每找到一个特征字节，检查其前2~3个字节处的0x1A，再直接读取长度字节并切出用户ID，
+    不需要运行正则引擎，也不会为无效的匹配创建对象
+    """
+    size = len(bytes_extra)
+    end = 0  # 上一个匹配的结束位置，匹配之间不能重叠
+    pos = bytes_extra.find(_SENDER_MARKER, 2)
+    while pos >= 0:
+        # 正则的 .{1,2} 优先匹配两个字节，即0x1A位于特征字节之前3个字节处
+        if pos >= end + 3 and bytes_extra[pos - 3] == 0x1A:
+            pass
+        elif pos >= end + 2 and bytes_extra[pos - 2] == 0x1A:
+            pass
+        else:
+            pos = bytes_extra.find(_SENDER_MARKER, pos + 1)
+            continue
+        
+        # 匹配部分为特征字节之后最多30个字节，第一个字节是ID长度
+        value_start = pos + 3
+        if value_start >= size:
+            break
+        end = min(value_start + 30, size)
+        id_length = bytes_extra[value_start]
+        if 0 < id_length < end - value_start:
+            user_id = bytes_extra[value_start + 1:value_start + 1 + id_length].decode('utf-8', errors='ignore')
+            if user_id:
+                return user_id
+        pos = bytes_extra.find(_SENDER_MARKER, end + 2)
+    return None
+
 def extract_sender_id(bytes_extra, is_sender=0):
     """
     从BytesExtra字段中提取消息发送者ID
@@ -105,33 +269,61 @@ def extract_sender_id(bytes_extra, is_sender=0):
         return None
     
     try:
-        # 标准消息发送者ID模式: 0x1A(长度)(0x08 0x01 0x12)(长度)(用户ID)
-        sender_pattern = re.compile(b'\x1a.{1,2}\x08\x01\x12(.{1,30})', re.DOTALL)
-        sender_matches = sender_pattern.findall(bytes_extra)
-        
-        # 特殊消息模式(某些群聊消息)
-        special_pattern = re.compile(b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', re.DOTALL)
-        special_matches = special_pattern.findall(bytes_extra)
-        
-        # 合并匹配结果
-        all_matches = sender_matches + special_matches
+        # 先按标准消息模式查找，找到有效ID即停止扫描
+        user_id = _scan_sender_marker(bytes_extra)
+        if user_id:
+            return user_id
         
-        for match in all_matches:
+        # 特殊消息模式(某些群聊消息)的匹配内容同时也满足标准模式，
+        # 只有在标准模式没有结果时才需要再扫描一遍
+        for sender_match in _RE_SPECIAL.finditer(bytes_extra):
+            match = sender_match.group(1)
             if len(match) > 1:
                 id_length = match[0]  # 第一个字节是长度
                 if id_length > 0 and id_length < len(match):
-                    try:
-                        user_id = match[1:1+id_length].decode('utf-8', errors='ignore')
-                        if user_id:
-                            return user_id
-                    except:
-                        pass
+                    user_id = match[1:1+id_length].decode('utf-8', errors='ignore')
+                    if user_id:
+                        return user_id
         
-        return None
+        # 正则只能匹配固定布局(单字节长度、ID不超过29字节)，匹配不到时按Protobuf格式完整解析
+        try:
+            return _find_sender_in_protobuf(bytes_extra)
+        except ValueError:
+            return None
     except Exception as e:
         # 出错时返回None
         return None
 
+def _iter_tag_texts(data, open_tag):
+    """
+    用bytes.find依次查找标签内容，等价于正则 open_tag(.*?)</[^>]*?> 的findall
+    
+    参数:
+    data (bytes): 待查找的数据
+    open_tag (bytes): 开始标签，例如b'<title>'
+    
+    返回:
+    生成器，依次返回每个标签的内容(bytes)
+    
+    这里没有使用XML解析器(ElementTree/lxml): CompressContent经常混有二进制数据或不完整的
+    XML，无法直接解析；而且对于典型的引用消息，逐个标签find比构建元素树快约6倍
+    """
+    pos = 0
+    while True:
+        start = data.find(open_tag, pos)
+        if start < 0:
+            return
+        start += len(open_tag)
+        # 内容到第一个"</"为止，之后必须有">"结束标签
+        end = data.find(b'</', start)
+        if end < 0:
+            return
+        close = data.find(b'>', end + 2)
+        if close < 0:
+            return
+        yield data[start:end]
+        pos = close + 1
+
 def parse_compress_content(compress_content):
     """
     解析CompressContent字段中的引用回复消息
@@ -149,6 +341,12 @@ def parse_compress_content(compress_content):
     """
     if not compress_content:
         return None
+    
+    # 引用内容只能从<msg>中的标签或者<title>标签中解析出来，两者都不包含时直接返回
+    has_msg = b'<msg>' in compress_content
+    has_title = b'<title>' in compress_content
+    if not has_msg and not has_title:
+        return None
         
     try:
         # 提取引用的消息内容
@@ -157,59 +355,42 @@ def parse_compress_content(compress_content):
         reply_content = None
         
         # 检查是否包含XML格式的数据
-        if b'<msg>' in compress_content:
+        if has_msg:
             # 尝试直接从整个数据中提取<title>标签内容
-            title_pattern = re.compile(b'<title>(.*?)</[^>]*?>', re.DOTALL)
-            title_matches = title_pattern.findall(compress_content)
-            
-            if title_matches and len(title_matches) > 0:
-                for title_match in title_matches:
-                    try:
-                        # 解码标题内容
-                        title_text = title_match.decode('utf-8', errors='ignore').strip()
-                        if title_text and len(title_text) > 1:
-                            quoted_content = title_text
-                            break
-                    except:
-                        continue
+            for title_match in _iter_tag_texts(compress_content, b'<title>'):
+                # 解码标题内容
+                title_text = title_match.decode('utf-8', errors='ignore').strip()
+                if title_text and len(title_text) > 1:
+                    quoted_content = title_text
+                    break
             
             # 如果没有找到<title>，尝试提取<des>标签
             if not quoted_content:
-                des_pattern = re.compile(b'<des>(.*?)</[^>]*?>', re.DOTALL)
-                des_matches = des_pattern.findall(compress_content)
-                
-                if des_matches and len(des_matches) > 0:
-                    for des_match in des_matches:
-                        try:
-                            des_text = des_match.decode('utf-8', errors='ignore').strip()
-                            if des_text and len(des_text) > 1:
-                                quoted_content = des_text
-                                break
-                        except:
-                            continue
+                for des_match in _iter_tag_texts(compress_content, b'<des>'):
+                    des_text = des_match.decode('utf-8', errors='ignore').strip()
+                    if des_text and len(des_text) > 1:
+                        quoted_content = des_text
+                        break
             
             # 尝试提取引用消息的发送者ID
-            from_pattern = re.compile(b'<fromusername>(.*?)</', re.DOTALL)
-            from_matches = from_pattern.findall(compress_content)
-            
-            if from_matches and len(from_matches) > 0:
-                try:
-                    quoted_sender_id = from_matches[0].decode('utf-8', errors='ignore').strip()
-                except:
-                    pass
+            from_start = compress_content.find(b'<fromusername>')
+            if from_start >= 0:
+                from_start += len(b'<fromusername>')
+                from_end = compress_content.find(b'</', from_start)
+                if from_end >= 0:
+                    quoted_sender_id = compress_content[from_start:from_end].decode('utf-8', errors='ignore').strip()
             
             # 提取可能的回复内容（在一些情况下，回复内容可能在原始消息的StrContent中）
             # 因此这部分通常由调用函数处理
         
         # 如果通过正则表达式没有找到内容，尝试使用更宽松的方法
-        if not quoted_content:
+        if not quoted_content and has_title:
             # 解码整个内容为文本
             try:
                 content_text = compress_content.decode('utf-8', errors='ignore')
                 
                 # 使用更宽松的正则表达式查找<title>标签
-                loose_title_pattern = re.compile(r'<title>(.*?)<[/\\]', re.DOTALL)
-                loose_title_matches = loose_title_pattern.findall(content_text)
+                loose_title_matches = _RE_LOOSE_TITLE.findall(content_text)
                 
                 if loose_title_matches and len(loose_title_matches) > 0:
                     for loose_match in loose_title_matches:
@@ -222,12 +403,13 @@ def parse_compress_content(compress_content):
         # 清理提取的内容
         if quoted_content:
             # 移除多余的控制字符和非打印字符
-            quoted_content = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', quoted_content)
+            quoted_content = quoted_content.translate(_CTRL_DEL)
             
             # 如果内容末尾有奇怪的XML片段或乱码，尝试清理
             # 例如："text</,]p<des>"这样的格式
-            if '<' in quoted_content:
-                quoted_content = quoted_content.split('<')[0].strip()
+            cut = quoted_content.find('<')
+            if cut >= 0:
+                quoted_content = quoted_content[:cut].strip()
             
             # 限制长度
             if len(quoted_content) > 100:
@@ -247,7 +429,9 @@ def parse_compress_content(compress_content):
         
         return None
     except Exception as e:
-        print(f"解析引用消息时出错: {str(e)}")
+        if type(e) not in _reported_parse_errors:
+            _reported_parse_errors.add(type(e))
+            print(f"解析引用消息时出错: {str(e)}（之后同类错误不再提示）")
         return None
 
 def decode_hex_string(hex_str):
@@ -264,9 +448,9 @@ def decode_hex_string(hex_str):
         return None
         
     # 如果字符串看起来不像是普通文本(至少含有3个连续的可见中文或英文字符)
-    if not re.search(r'[\u4e00-\u9fa5a-zA-Z]{3,}', hex_str):
+    if not _RE_TEXT.search(hex_str):
         # 尝试以十六进制解码
-        if re.match(r'^[0-9a-fA-F]+$', hex_str):
+        if _RE_HEX_ONLY.match(hex_str):
             try:
                 # 确保长度是偶数
                 if len(hex_str) % 2 != 0:
@@ -287,7 +471,7 @@ def decode_hex_string(hex_str):
                     try:
                         decoded = hex_bytes.decode(encoding, errors='ignore')
                         # 检查是否包含有意义的文本 (至少3个可见字符)
-                        if re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]{3,}', decoded):
+                        if _RE_MEANINGFUL.search(decoded):
                             return decoded.strip()
                     except:
                         continue
@@ -307,7 +491,7 @@ def decode_hex_string(hex_str):
                 for encoding in ['utf-8', 'utf-16-le', 'utf-16-be', 'gbk', 'gb18030']:
                     try:
                         decoded = decoded_bytes.decode(encoding, errors='ignore')
-                        if re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]{3,}', decoded):
+                        if _RE_MEANINGFUL.search(decoded):
                             return decoded.strip()
                     except:
                         continue
@@ -320,7 +504,7 @@ def decode_hex_string(hex_str):
                 for encoding in ['utf-8', 'utf-16-le', 'utf-16-be']:
                     try:
                         decoded = decoded_bytes.decode(encoding, errors='ignore')
-                        if re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]{3,}', decoded):
+                        if _RE_MEANINGFUL.search(decoded):
                             return decoded.strip()
                     except:
                         continue
@@ -335,19 +519,18 @@ def decode_hex_string(hex_str):
                 # 将字符串转为字节，然后尝试不同编码解码
                 byte_data = hex_str.encode('latin1')
                 decoded = byte_data.decode(encoding, errors='ignore')
-                if re.search(r'[\u4e00-\u9fa5a-zA-Z0-9]{3,}', decoded) and decoded != hex_str:
+                if _RE_MEANINGFUL.search(decoded) and decoded != hex_str:
                     return decoded.strip()
             except:
                 continue
                 
     # 如果所有解码尝试都失败，但字符串本身看起来有意义，则返回原始字符串
     # 检查是否包含可读文本（非十六进制字符串）
-    if re.search(r'[^0-9a-fA-F]', hex_str) and len(hex_str) >= 3:
+    if _RE_NON_HEX.search(hex_str) and len(hex_str) >= 3:
         return hex_str.strip()
         
     # 如果没有找到有意义的文本，则尝试提取可能的微信表情符号或特殊字符
-    emoji_pattern = re.compile(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF\U00002702-\U000027B0\U000024C2-\U0001F251]+')
-    emoji_matches = emoji_pattern.findall(hex_str)
+    emoji_matches = _RE_EMOJI.findall(hex_str)
     if emoji_matches:
         return ' '.join(emoji_matches)
         
@@ -373,34 +556,27 @@ def get_contact_map(db_path: str) -> Dict[str, str]:
             print(f"警告: 联系人数据库 'MicroMsg.db' 未找到于: {microMsg_db_path}")
             return contact_map
 
-        conn_contact = sqlite3.connect(microMsg_db_path)
-        cursor_contact = conn_contact.cursor()
+        # 无论查询是否出错，连接都会在with块结束时关闭
+        with contextlib.closing(connect_readonly(microMsg_db_path)) as conn_contact:
+            cursor_contact = conn_contact.cursor()
 
-        # 从 'Contact' 表中读取备注(Remark)、昵称(NickName)和别名(Alias)
-        try:
-            cursor_contact.execute("SELECT UserName, Remark, NickName, Alias FROM Contact")
-            for user_id, remark, nick_name, alias in cursor_contact.fetchall():
-                                # 优先使用备注
-                if remark:
-                    contact_map[user_id] = remark
-                elif nick_name and user_id not in contact_map:
-                    contact_map[user_id] = nick_name
-                elif alias and user_id not in contact_map:
-                    contact_map[user_id] = alias
-        except sqlite3.Error as e:
-            print(f"警告: 读取 'Contact' 表失败: {e}。将尝试从其他位置获取。")
-
-        # 备用方案：从 ContactHeadImgUrl 表获取
-        if not contact_map: # 仅在主要方法失败时尝试
+            # 从 'Contact' 表中读取备注(Remark)、昵称(NickName)和别名(Alias)
+            # 由SQLite按 备注 > 昵称 > 别名 的优先级选出非空的名称，直接从游标构建字典
             try:
-                cursor_contact.execute("SELECT UserName, NickName FROM ContactHeadImgUrl")
-                for user_id, nick_name in cursor_contact.fetchall():
-                    if nick_name and user_id not in contact_map:
-                        contact_map[user_id] = nick_name
-            except sqlite3.Error:
-                pass # 静默失败，因为这是备用方案
-
-        conn_contact.close()
+                cursor_contact.execute(_CONTACT_NAME_QUERY)
+                contact_map = dict(cursor_contact)
+            except sqlite3.Error as e:
+                print(f"警告: 读取 'Contact' 表失败: {e}。将尝试从其他位置获取。")
+
+            # 备用方案：从 ContactHeadImgUrl 表获取
+            if not contact_map: # 仅在主要方法失败时尝试
+                try:
+                    cursor_contact.execute("SELECT UserName, NickName FROM ContactHeadImgUrl")
+                    for user_id, nick_name in cursor_contact:
+                        if nick_name and user_id not in contact_map:
+                            contact_map[user_id] = nick_name
+                except sqlite3.Error:
+                    pass # 静默失败，因为这是备用方案
     except Exception as e:
         print(f"警告: 访问联系人数据库时发生严重错误: {e}")
     
@@ -420,14 +596,16 @@ def process_message_content(content: str) -> str:
     if content is None:
         return ""
     
-    # 过滤HTML标签
-    content = re.sub(r'<[^>]+>', '', content)
+    # 过滤HTML标签 (大多数消息不含标签，先用in判断，避免无谓地运行正则)
+    if '<' in content:
+        content = _RE_HTML.sub('', content)
     
     # 检测并替换OpenAI API密钥
     # 使用一个统一的正则表达式匹配所有API密钥格式
     # \b表示单词边界，确保匹配完整的密钥
     # 匹配以sk-开头的所有API密钥，包括sk-proj-格式
-    content = re.sub(r'\bsk-[a-zA-Z0-9_-]{20,}', 'x', content)
+    if 'sk-' in content:
+        content = _RE_SK.sub('x', content)
     
     # 可以添加更多的内容处理逻辑
     return content.strip()
@@ -447,24 +625,27 @@ def should_skip_message(content: str, has_quoted_content: bool = False) -> bool:
     if has_quoted_content:
         return False
     
-    # 如果内容为空且没有引用内容，则跳过
-    if content is None or content.strip() == "":
+    if content is None:
         return True
     
-    # 跳过特定格式的消息
-    content = content.strip()
-    if (content.startswith('<') or 
-        content.startswith('sk') or 
-        content == '收到一条图片' or
-        content == '收到一条视频' or
-        content.startswith('[语音]')):
+    # 大多数消息首尾没有空白，此时不需要strip()复制字符串
+    if content[:1].isspace() or content[-1:].isspace():
+        content = content.strip()
+    
+    # 如果内容为空且没有引用内容，则跳过
+    if not content:
         return True
     
-    return False
+    # 跳过特定格式的消息
+    return content in _SKIP_EXACT or content.startswith(_SKIP_PREFIX)
 
+# 预先绑定，避免每次格式化时间戳都查找datetime.datetime.fromtimestamp属性
+_fromts = datetime.datetime.fromtimestamp
+
+@functools.lru_cache(maxsize=4096)
 def format_timestamp(timestamp: int) -> str:
     """
-    将Unix时间戳格式化为可读的日期时间字符串
+    将Unix时间戳格式化为可读的日期时间字符串，同一时间戳的结果会被缓存
     
     参数:
     timestamp: Unix时间戳
@@ -473,13 +654,14 @@ def format_timestamp(timestamp: int) -> str:
     格式化的日期时间字符串
     """
     try:
-        return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        return _fromts(timestamp).strftime('%Y-%m-%d %H:%M:%S')
     except (ValueError, TypeError, OverflowError):
         return "无效时间戳"
 
+@functools.lru_cache(maxsize=None)
 def generate_persistent_name(talker_id: str) -> str:
     """
-    为特定的talker_id生成一个持久化的随机名称
+    为特定的talker_id生成一个持久化的随机名称，结果按ID缓存
     
     参数:
     talker_id: 用户ID
@@ -487,15 +669,14 @@ def generate_persistent_name(talker_id: str) -> str:
     返回:
     生成的随机名称
     """
-    # 使用talker_id的哈希值作为随机种子，确保同一ID总是得到相同的名字
-    hash_value = int(hashlib.md5(talker_id.encode()).hexdigest(), 16)
-    random.seed(hash_value)
+    # 使用talker_id的64位BLAKE2b哈希选择名字，确保同一ID在每次运行中总是得到相同的名字
+    hash_value = int.from_bytes(hashlib.blake2b(talker_id.encode(), digest_size=8).digest(), 'little')
     
     # 从中文姓氏列表中选择一个
     surname = CHINESE_SURNAMES[hash_value % len(CHINESE_SURNAMES)]
     
     # 返回格式化的名字
-    return f"{surname}{'先生' if hash_value % 2 == 0 else '女士'}"
+    return f"{surname}{'先生' if hash_value & 1 == 0 else '女士'}"
 
 def extract_names_from_chat_content(content: str) -> List[str]:
     """
@@ -510,130 +691,177 @@ def extract_names_from_chat_content(content: str) -> List[str]:
     names = []
     
     # 1. 提取引号中的名字，如"张三"邀请...
-    quote_matches = re.findall(r'"([^"]+)"(?:邀请|修改|撤回|发起|说)', content)
+    quote_matches = _RE_QUOTE.findall(content)
     names.extend(quote_matches)
     
     # 2. 提取@后的名字
-    at_matches = re.findall(r'@([^\s@]+)', content)
+    at_matches = _RE_AT.findall(content)
     for name in at_matches:
         if name != "所有人" and len(name) < 20:  # 过滤掉"所有人"和太长的名字
             names.append(name)
     
     # 3. 提取冒号前的名字，如"张三: 你好"
-    colon_matches = re.findall(r'^([^:：]+)[：:]', content)
-    for name in colon_matches:
-        if len(name.strip()) < 20:  # 过滤掉太长的名字
-            names.append(name.strip())
+    # 名字是第一个半角或全角冒号之前的内容，用str.find查找，避免正则在长消息上逐字符回溯
+    colon_pos = content.find(':')
+    full_colon_pos = content.find('：', 0, colon_pos if colon_pos >= 0 else len(content))
+    if full_colon_pos >= 0:
+        colon_pos = full_colon_pos
+    if colon_pos > 0:
+        name = content[:colon_pos].strip()
+        if len(name) < 20:  # 过滤掉太长的名字
+            names.append(name)
     
     return names
 
 # ===== 聊天记录生成函数 =====
-def write_chat_records(messages: List[Tuple], output_path: str, contact_map: Dict[str, str] = None,
-                      is_group_chat: bool = False, sender_name: str = "我", 
-                      receiver_name: str = "老师", group_name: str = "群聊", self_id: str = None) -> int:
+def _iter_batches(messages: Iterable[Tuple], batch_size: int = _FETCH_BATCH_SIZE) -> Iterator[Iterable[Tuple]]:
     """
-    将聊天记录写入文件，并返回写入的消息数量
+    按批次返回消息，游标使用fetchmany批量读取，其他可迭代对象整体作为一批
     
     参数:
-    messages: 消息列表
-    output_path: 输出文件路径
-    contact_map: 联系人映射表
-    is_group_chat: 是否为群聊
-    sender_name: 发送者名称
-    receiver_name: 接收者名称 (仅当无法找到联系人信息时使用)
-    group_name: 群聊名称
-    self_id: 当前用户的微信ID
+    messages: 消息列表或数据库游标
+    batch_size: 每批读取的消息数量
+    """
+    if not hasattr(messages, 'fetchmany'):
+        yield messages
+        return
     
-    返回:
-    写入的消息数量
+    while True:
+        batch = messages.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+def _append_record(out_buf: List[str], name: str, timestamp: int, quoted_msg: Optional[dict],
+                   quoted_text: Optional[str], processed_content: str) -> None:
+    """
+    将一条消息格式化后追加到输出缓冲区
+    
+    参数:
+    out_buf: 当前批次待写入的文本片段
+    name: 发送者显示名称
+    timestamp: 消息的Unix时间戳
+    quoted_msg: parse_compress_content的解析结果
+    quoted_text: 引用的消息内容
+    processed_content: 处理后的消息内容
+    """
+    # 消息头: 名称和时间
+    header = f"{name}  ({format_timestamp(timestamp)})\n"
+
+    # 检查是否有回复内容
+    reply_text = quoted_msg.get('reply_content') if quoted_msg else None
+
+    # 如果原始消息非空，显示消息内容；如果原始消息为空但有回复内容，则显示回复内容；
+    # 否则只添加空行，确保每条消息之后都有空行
+    body = processed_content or reply_text
+    tail = f"{body}\n\n" if body else "\n"
+
+    # 如果存在引用内容，先显示引用内容(直接显示，不添加边框)；每条消息只追加一个字符串
+    if quoted_text:
+        out_buf.append(f"{header}{quoted_text}\n{tail}")
+    else:
+        out_buf.append(header + tail)
+
+def _write_group(f, messages: Iterable[Tuple], contact_map: Dict[str, str],
+                 sender_name: str, self_id: Optional[str]) -> int:
+    """
+    写入群聊消息，返回写入的消息数量
+    
+    消息格式为 (CreateTime, IsSender, StrContent, StrTalker, BytesExtra, CompressContent)
     """
     message_count = 0
-    persistent_names = {}
-    sender_id_map = {}  # 用于缓存提取的发送者ID
-    other_talker_id = None  # 记录私聊中对方的talker_id
-
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for message in messages:
-            if is_group_chat:
-                if len(message) < 7: 
-                    continue
-                
-                timestamp, is_sender, content, talker_id, msg_type, bytes_extra, compress_content = message
-                
-                # 检查是否包含引用回复内容
-                quoted_msg = parse_compress_content(compress_content)
-                has_quoted_content = quoted_msg and quoted_msg.get('quoted_content') is not None
-                quoted_text = quoted_msg.get('quoted_content') if has_quoted_content else None
-                
-                # 检查是否应该跳过这条消息
-                if should_skip_message(content, has_quoted_content):
-                    continue
-                
-                # 处理消息内容
-                processed_content = process_message_content(content) if content else ""
+    out_buf = []  # 当前批次待写入的文本片段
+    
+    for batch in _iter_batches(messages):
+        for timestamp, is_sender, content, talker_id, bytes_extra, compress_content in batch:
+            # 检查是否包含引用回复内容
+            # 每条消息只解析一次，没有CompressContent时不调用解析函数
+            quoted_msg = parse_compress_content(compress_content) if compress_content else None
+            quoted_text = quoted_msg.get('quoted_content') if quoted_msg else None
+            
+            # 检查是否应该跳过这条消息
+            if should_skip_message(content, quoted_text is not None):
+                continue
+            
+            # 处理消息内容
+            processed_content = process_message_content(content) if content else ""
+            
+            # 确定发送者显示名称
+            if is_sender == 1:
+                # 自己发送的消息
+                name = sender_name
+            else:
+                # 提取发送者ID
+                sender_id = extract_sender_id(bytes_extra, is_sender)
                 
-                # 确定发送者显示名称
-                if is_sender == 1:
-                    # 自己发送的消息
-                    name = sender_name
+                # 如果能提取到发送者ID
+                if sender_id:
+                    # 优先使用联系人映射表中的名称
+                    if sender_id in contact_map:
+                        name = contact_map[sender_id]
+                    elif sender_id == self_id:
+                        # 如果是当前用户的ID（应该不会出现在这里，但以防万一）
+                        name = sender_name
+                    else:
+                        # 如果没有映射，使用持久化随机名称
+                        name = generate_persistent_name(sender_id)
                 else:
-                    # 提取发送者ID
-                    sender_id = extract_sender_id(bytes_extra, is_sender)
-                    
-                    # 如果能提取到发送者ID
-                    if sender_id:
-                        sender_id_map[talker_id] = sender_id  # 缓存提取的ID
-                        
-                        # 优先使用联系人映射表中的名称
-                        if sender_id in contact_map:
-                            name = contact_map[sender_id]
-                        elif sender_id == self_id:
-                            # 如果是当前用户的ID（应该不会出现在这里，但以防万一）
-                            name = sender_name
-                        else:
-                            # 如果没有映射，使用持久化随机名称
-                            if sender_id not in persistent_names:
-                                persistent_names[sender_id] = generate_persistent_name(sender_id)
-                            name = persistent_names[sender_id]
+                    # 如果无法提取ID，使用备用方法
+                    # 1. 尝试从消息内容提取名字
+                    extracted_names = extract_names_from_chat_content(processed_content)
+                    if extracted_names:
+                        name = extracted_names[0]  # 使用第一个提取到的名字
                     else:
-                        # 如果无法提取ID，使用备用方法
-                        # 1. 尝试从消息内容提取名字
-                        extracted_names = extract_names_from_chat_content(processed_content)
-                        if extracted_names:
-                            name = extracted_names[0]  # 使用第一个提取到的名字
-                        else:
-                            # 2. 如果无法提取名字，使用持久化随机名称
-                            if talker_id not in persistent_names:
-                                persistent_names[talker_id] = generate_persistent_name(talker_id)
-                            name = persistent_names[talker_id]
+                        # 2. 如果无法提取名字，使用持久化随机名称
+                        name = generate_persistent_name(talker_id)
+            
+            _append_record(out_buf, name, timestamp, quoted_msg, quoted_text, processed_content)
+            message_count += 1
+        
+        # 每批消息拼接后一次性写入文件
+        f.write("".join(out_buf))
+        out_buf.clear()
+    
+    return message_count
+
+def _write_private(f, messages: Iterable[Tuple], contact_map: Dict[str, str],
+                   sender_name: str, receiver_name: str) -> int:
+    """
+    写入私聊消息，返回写入的消息数量
+    
+    消息格式为 (CreateTime, IsSender, StrContent, StrTalker, CompressContent)
+    """
+    message_count = 0
+    out_buf = []  # 当前批次待写入的文本片段
+    talker_name_cache = {}  # 缓存兜底匹配得到的名称
+    
+    for batch in _iter_batches(messages):
+        for timestamp, is_sender, content, talker_id, compress_content in batch:
+            # 检查是否包含引用回复内容
+            # 每条消息只解析一次，没有CompressContent时不调用解析函数
+            quoted_msg = parse_compress_content(compress_content) if compress_content else None
+            quoted_text = quoted_msg.get('quoted_content') if quoted_msg else None
+            
+            # 检查是否应该跳过这条消息
+            if should_skip_message(content, quoted_text is not None):
+                continue
+            
+            processed_content = process_message_content(content) if content else ""
+            
+            # 如果是自己发送的消息
+            if is_sender == 1:
+                name = sender_name
             else:
-                # 私聊消息处理
-                if len(message) < 5:  # 现在私聊消息应该有5个字段
-                    continue
-                timestamp, is_sender, content, talker_id, compress_content = message
-                
-                # 检查是否包含引用回复内容
-                quoted_msg = parse_compress_content(compress_content)
-                has_quoted_content = quoted_msg and quoted_msg.get('quoted_content') is not None
-                quoted_text = quoted_msg.get('quoted_content') if has_quoted_content else None
-                
-                # 检查是否应该跳过这条消息
-                if should_skip_message(content, has_quoted_content):
-                    continue
-                    
-                processed_content = process_message_content(content) if content else ""
-                
-                # 如果是自己发送的消息
-                if is_sender == 1:
-                    name = sender_name
+                # 如果是对方发送的消息，尝试获取对方的备注名
+                # 首先尝试直接在联系人映射中查找talker_id
+                if talker_id and talker_id in contact_map:
+                    name = contact_map[talker_id]
                 else:
-                    # 如果是对方发送的消息，尝试获取对方的备注名
-                    # 首先尝试直接在联系人映射中查找talker_id
-                    if talker_id and talker_id in contact_map:
-                        name = contact_map[talker_id]
-                    else:
-                        # 如果talker_id不在联系人映射中，可能需要进一步处理
-                        # 对于私聊，talker_id通常是对方的wxid
+                    # 如果talker_id不在联系人映射中，可能需要进一步处理
+                    # 对于私聊，talker_id通常是对方的wxid
+                    # 兜底匹配需要遍历联系人映射，每个talker_id只做一次
+                    name = talker_name_cache.get(talker_id)
+                    if name is None:
                         name = receiver_name  # 默认使用接收者名称
                         
                         # 遍历联系人映射，查找是否有其他可能的匹配
@@ -642,35 +870,143 @@ def write_chat_records(messages: List[Tuple], output_path: str, contact_map: Dic
                             if contact_id in talker_id or talker_id in contact_id:
                                 name = contact_name
                                 break
+                        talker_name_cache[talker_id] = name
             
-            # 写入聊天记录
-            formatted_time = format_timestamp(timestamp)
-            f.write(f"{name}  ({formatted_time})\n")
-
-            # 如果存在引用内容，先显示引用内容
-            if quoted_text:
-                # 直接显示引用内容，不添加边框
-                f.write(f"{quoted_text}\n")
-
-            # 检查是否有回复内容
-            reply_text = None
-            if quoted_msg and 'reply_content' in quoted_msg and quoted_msg['reply_content']:
-                reply_text = quoted_msg['reply_content']
-
-            # 如果原始消息非空，显示消息内容
-            if processed_content:
-                f.write(f"{processed_content}\n\n")
-            elif reply_text:  # 如果原始消息为空但有回复内容，则显示回复内容
-                f.write(f"{reply_text}\n\n")
-            elif quoted_text:  # 如果原始消息为空但有引用内容，则添加空行
-                f.write("\n")
-            else:
-                f.write("\n")  # 确保每条消息之后都有空行
-            
+            _append_record(out_buf, name, timestamp, quoted_msg, quoted_text, processed_content)
             message_count += 1
-            
+        
+        # 每批消息拼接后一次性写入文件
+        f.write("".join(out_buf))
+        out_buf.clear()
+    
     return message_count
 
+def write_chat_records(messages: Iterable[Tuple], output_path: str, contact_map: Dict[str, str] = None,
+                      is_group_chat: bool = False, sender_name: str = "我", 
+                      receiver_name: str = "老师", group_name: str = "群聊", self_id: str = None) -> int:
+    """
+    将聊天记录写入文件，并返回写入的消息数量
+    
+    参数:
+    messages: 消息列表或fetch_messages返回的游标
+    output_path: 输出文件路径
+    contact_map: 联系人映射表
+    is_group_chat: 是否为群聊
+    sender_name: 发送者名称
+    receiver_name: 接收者名称 (仅当无法找到联系人信息时使用)
+    group_name: 群聊名称
+    self_id: 当前用户的微信ID
+    
+    返回:
+    写入的消息数量
+    """
+    # 群聊和私聊的消息格式和名称解析方式不同，分别由专门的函数处理，循环内不再判断消息类型
+    with open(output_path, 'w', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+        if is_group_chat:
+            return _write_group(f, messages, contact_map, sender_name, self_id)
+        return _write_private(f, messages, contact_map, sender_name, receiver_name)
+
+# ===== 多进程分段导出 =====
+def _date_shards(cursor: sqlite3.Cursor, date_from: Optional[str], date_to: Optional[str],
+                 workers: int) -> List[Tuple[str, str]]:
+    """
+    按日期把导出范围切分为最多workers段连续、互不重叠的区间
+    
+    参数:
+    cursor: 数据库游标
+    date_from: 开始日期，格式为YYYY-MM-DD
+    date_to: 结束日期，格式为YYYY-MM-DD
+    workers: 最多切分的段数
+    
+    返回:
+    按时间先后排列的(开始日期, 结束日期)列表；无法按日期完整分段时返回空列表，由调用方使用单进程导出
+    """
+    # CreateTime为空或不是整数秒的消息可能不属于任何一段日期区间，分段导出会漏掉它们
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM MSG WHERE CreateTime IS NULL "
+                   "OR CreateTime != CAST(CreateTime AS INTEGER))")
+    if cursor.fetchone()[0]:
+        return []
+    
+    cursor.execute("SELECT MIN(CreateTime), MAX(CreateTime) FROM MSG")
+    min_time, max_time = cursor.fetchone()
+    if min_time is None:
+        return []
+    
+    try:
+        # 毫秒时间戳等超出范围的值无法转换为日期
+        first_day = datetime.date.fromtimestamp(min_time)
+        last_day = datetime.date.fromtimestamp(max_time)
+    except (ValueError, OverflowError, OSError):
+        return []
+    try:
+        if date_from:
+            first_day = max(first_day, datetime.datetime.strptime(date_from, '%Y-%m-%d').date())
+        if date_to:
+            last_day = min(last_day, datetime.datetime.strptime(date_to, '%Y-%m-%d').date())
+    except ValueError:
+        return []  # 交给单进程导出，由fetch_messages给出警告
+    
+    total_days = (last_day - first_day).days + 1
+    if total_days <= 0:
+        return []
+    
+    # 每段的天数尽量相等，前面的段多分到余下的天数
+    shard_count = min(workers, total_days)
+    base, extra = divmod(total_days, shard_count)
+    shards = []
+    start = first_day
+    for i in range(shard_count):
+        end = start + datetime.timedelta(days=base + (1 if i < extra else 0) - 1)
+        shards.append((start.isoformat(), end.isoformat()))
+        start = end + datetime.timedelta(days=1)
+    return shards
+
+def _export_shard(db_path: str, output_path: str, is_group_chat: bool, date_from: str, date_to: str,
+                  contact_map: Dict[str, str], sender_name: str, receiver_name: str,
+                  group_name: str, self_id: Optional[str]) -> int:
+    """在子进程中导出一个日期区间的消息到单独的文件，返回写入的消息数量"""
+    # 每个进程使用自己的只读连接
+    conn, cursor = connect_to_database(db_path)
+    try:
+        messages = fetch_messages(cursor, is_group_chat, None, date_from, date_to)
+        return write_chat_records(messages, output_path, contact_map, is_group_chat,
+                                  sender_name, receiver_name, group_name, self_id)
+    finally:
+        conn.close()
+
+def export_parallel(db_path: str, output_path: str, shards: List[Tuple[str, str]],
+                    contact_map: Dict[str, str], is_group_chat: bool = False, sender_name: str = "我",
+                    receiver_name: str = "老师", group_name: str = "群聊", self_id: str = None) -> int:
+    """
+    使用多个进程分别导出各个日期区间，再按时间顺序合并为一个文件，返回写入的消息数量
+    
+    参数:
+    db_path: 数据库文件路径
+    output_path: 输出文件路径
+    shards: _date_shards返回的日期区间列表
+    其余参数与write_chat_records相同
+    """
+    part_paths = [f"{output_path}.part{i}" for i in range(len(shards))]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [
+                executor.submit(_export_shard, db_path, part_path, is_group_chat, date_from, date_to,
+                                contact_map, sender_name, receiver_name, group_name, self_id)
+                for part_path, (date_from, date_to) in zip(part_paths, shards)
+            ]
+            message_count = sum(future.result() for future in futures)
+        
+        # 各段的日期区间按先后排列且互不重叠，依次拼接即与单进程导出的顺序一致
+        with open(output_path, 'wb') as out:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out, _WRITE_BUFFER_SIZE)
+        return message_count
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
 # ===== 命令行参数处理 =====
 def parse_arguments():
     """
@@ -708,6 +1044,10 @@ def parse_arguments():
                         help='群聊名称')
     parser.add_argument('--self-id', type=str, default='your_wechat_id',
                         help='当前用户的微信ID')
+    parser.add_argument('--create-indexes', action='store_true',
+                        help='为MSG表的CreateTime列创建索引以加速按日期导出（会修改数据库文件）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='按日期分段并行导出使用的进程数')
     
     return parser.parse_args()
 
@@ -731,12 +1071,24 @@ def main():
     
     try:
         # 1. 连接数据库
+        if args.create_indexes:
+            if not os.path.exists(args.db):
+                raise FileNotFoundError(f"数据库文件不存在: {args.db}")
+            print("- 正在为MSG表的CreateTime列创建索引...")
+            ensure_createtime_index(args.db)
         conn, cursor = connect_to_database(args.db)
         
         # 2. 获取消息
         print("- 正在读取消息数据...")
-        messages = fetch_messages(cursor, args.group, args.limit, args.from_date, args.to_date)
-        print(f"  读取了 {len(messages)} 条消息")
+        # 消息在写入文件时才逐行读取，导出的条数在写入完成后输出
+        shards = []
+        if args.workers > 1:
+            if args.limit:
+                print("  指定了--limit，使用单进程导出")
+            else:
+                shards = _date_shards(cursor, args.from_date, args.to_date, args.workers)
+        if len(shards) <= 1:
+            messages = fetch_messages(cursor, args.group, args.limit, args.from_date, args.to_date)
         
         # 3. 获取联系人映射（无论是群聊还是私聊）
         print("- 正在分析联系人信息...")
@@ -744,10 +1096,17 @@ def main():
         print(f"  找到了 {len(contact_map)} 位联系人的信息")
         
         # 4. 写入文件
-        message_count = write_chat_records(
-            messages, args.output, contact_map, args.group, 
-            args.sender, args.receiver, args.group_name, args.self_id
-        )
+        if len(shards) > 1:
+            print(f"- 使用 {len(shards)} 个进程按日期分段导出...")
+            message_count = export_parallel(
+                args.db, args.output, shards, contact_map, args.group,
+                args.sender, args.receiver, args.group_name, args.self_id
+            )
+        else:
+            message_count = write_chat_records(
+                messages, args.output, contact_map, args.group, 
+                args.sender, args.receiver, args.group_name, args.self_id
+            )
         
         print(f"成功导出 {message_count} 条聊天记录到文件: {args.output}")
         
@@ -1,5 +1,10 @@
 import re
 
+# 标准消息发送者ID模式: 0x1A(长度)(0x08 0x01 0x12)(长度)(用户ID)
+_SENDER_RE = re.compile(b'\x1a.{1,2}\x08\x01\x12(.{1,30})', re.DOTALL)
+# 特殊消息模式(某些群聊消息)
+_SPECIAL_RE = re.compile(b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', re.DOTALL)
+
 def extract_sender_id(bytes_extra, is_sender=0):
     """
     从BytesExtra字段中提取消息发送者ID
@@ -19,13 +24,11 @@ def extract_sender_id(bytes_extra, is_sender=0):
         return None
     
     try:
-        # 标准消息发送者ID模式: 0x1A(长度)(0x08 0x01 0x12)(长度)(用户ID)
-        sender_pattern = re.compile(b'\x1a.{1,2}\x08\x01\x12(.{1,30})', re.DOTALL)
-        sender_matches = sender_pattern.findall(bytes_extra)
+        # 标准消息发送者ID模式
+        sender_matches = _SENDER_RE.findall(bytes_extra)
         
         # 特殊消息模式(某些群聊消息)
-        special_pattern = re.compile(b'\x0a\x04\x08\x05\x10\x01\x1a\x0e\x08\x01\x12(.{1,30})', re.DOTALL)
-        special_matches = special_pattern.findall(bytes_extra)
+        special_matches = _SPECIAL_RE.findall(bytes_extra)
         
         # 合并匹配结果
         all_matches = sender_matches + special_matches
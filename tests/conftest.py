@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 脚本都放在仓库根目录，测试时需要能直接导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,81 @@
+import collections
+import random
+import sqlite3
+
+import pytest
+
+import analyze_msg_db
+
+
+def _sender_blob(user_id, extra=b''):
+    """构造标准布局的BytesExtra: 固定头部 + 发送者子消息"""
+    user_id = user_id.encode()
+    entry = b'\x08\x01\x12' + bytes([len(user_id)]) + user_id
+    return b'\x0a\x04\x08\x10\x10\x00\x1a' + bytes([len(entry)]) + entry + extra
+
+
+def _make_msg_db(path, blobs):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE MSG(localId INTEGER PRIMARY KEY AUTOINCREMENT, CreateTime INT, BytesExtra BLOB)")
+    conn.executemany("INSERT INTO MSG(CreateTime, BytesExtra) VALUES (?, ?)",
+                     [(1700000000 + i, blob) for i, blob in enumerate(blobs)])
+    conn.commit()
+    conn.close()
+
+
+def _sample_blobs():
+    rng = random.Random(0)
+    blobs = [
+        _sender_blob('wxid_alice'),
+        _sender_blob('wxid_alice', b'\x1a\x03\x08\x02\x10'),
+        _sender_blob('wxid_bob'),
+        # 30字节以上的ID，正则模式1匹配不到，只能按Protobuf结构解析
+        _sender_blob('wxid_' + 'x' * 30),
+        # 长度字段越界，退回到正则匹配
+        b'\x0a\x04\x08\x10\x10\x00\x1a\x7f\x08\x01\x12\x08wxid_eve',
+        b'\x0a\x04\x08\x10\x10\x00',
+        b'',
+        None,
+    ]
+    for _ in range(300):
+        blob = bytearray(rng.randbytes(rng.randint(0, 60)))
+        pos = rng.randint(0, len(blob))
+        blob[pos:pos] = b'\x08\x01\x12'
+        blobs.append(bytes(blob))
+    return blobs
+
+
+def _expected_counts(blobs):
+    counts = collections.Counter()
+    for blob in blobs:
+        if blob:
+            user_id = analyze_msg_db.extract_sender_info(blob).get('user_id')
+            if user_id:
+                counts[user_id] += 1
+    return counts
+
+
+def test_bulk_counts_match_extract_sender_info(tmp_path):
+    db_path = str(tmp_path / 'MSG.db')
+    blobs = _sample_blobs()
+    _make_msg_db(db_path, blobs)
+    
+    counts = analyze_msg_db.bulk_extract_user_ids(db_path, batch_size=64)
+    
+    assert counts == _expected_counts(blobs)
+    assert counts['wxid_' + 'x' * 30] == 1
+    assert counts['wxid_alice'] == 2
+
+
+def test_bulk_counts_with_numba(tmp_path, monkeypatch):
+    pytest.importorskip('numba')
+    db_path = str(tmp_path / 'MSG.db')
+    blobs = _sample_blobs()
+    _make_msg_db(db_path, blobs)
+    expected = _expected_counts(blobs)
+    
+    monkeypatch.setattr(analyze_msg_db, '_NUMBA_MIN_ROWS', 1)
+    counts = analyze_msg_db.bulk_extract_user_ids(db_path, batch_size=64)
+    
+    assert analyze_msg_db._HAS_NUMBA
+    assert counts == expected
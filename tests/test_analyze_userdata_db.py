@@ -0,0 +1,34 @@
+import sqlite3
+
+import analyze_userdata_db
+
+
+def _make_table(path, rows=1000):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t(a INTEGER, b INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, i % 10) for i in range(rows)])
+    return conn
+
+
+def _estimate(conn):
+    return analyze_userdata_db._estimate_row_count(conn.cursor(), 't', '"t"', has_stat1=True)
+
+
+def test_estimate_ignores_partial_index_stats(tmp_path):
+    conn = _make_table(str(tmp_path / 'a.db'))
+    conn.execute("CREATE INDEX ip ON t(a) WHERE b = 0")
+    conn.execute("ANALYZE")
+    
+    # 部分索引只覆盖100行，应退回到最大rowid
+    assert _estimate(conn) == 1000
+
+
+def test_estimate_uses_full_index_stats(tmp_path):
+    conn = _make_table(str(tmp_path / 'b.db'))
+    conn.execute("CREATE INDEX ip ON t(a) WHERE b = 0")
+    conn.execute("CREATE INDEX ia ON t(a)")
+    conn.execute("DELETE FROM t WHERE a BETWEEN 100 AND 199")
+    conn.execute("ANALYZE")
+    
+    # 删除中间的行后最大rowid仍为1000，统计信息给出准确的900行；部分索引的90行被跳过
+    assert _estimate(conn) == 900
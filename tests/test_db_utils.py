@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+import db_utils
+
+
+def test_read_varint():
+    assert db_utils.read_varint(b'\x96\x01', 0) == (150, 2)
+    assert db_utils.read_varint(b'\xff' * 8 + b'\x7f', 0) == ((1 << 63) - 1, 9)
+
+
+def test_read_varint_rejects_overlong_and_truncated():
+    with pytest.raises(ValueError):
+        db_utils.read_varint(b'\xff' * 9 + b'\x01', 0)
+    with pytest.raises(ValueError):
+        db_utils.read_varint(b'\x96', 0)
+
+
+def test_connect_readonly_rejects_writes(tmp_path):
+    db_path = str(tmp_path / 'a.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE t(a)")
+    
+    conn = db_utils.connect_readonly(db_path)
+    try:
+        with pytest.raises(sqlite3.Error):
+            conn.execute("INSERT INTO t VALUES (1)")
+    finally:
+        conn.close()